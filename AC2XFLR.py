@@ -17,7 +17,7 @@ def createSection(parent, y, c, foil, x_sweep=0.000, dihedral=0.000, twist = 0.0
 	section = el.Element('Section')
 	createSimpleKVP('y_position', str(round(y, 3)), section)
 	createSimpleKVP('Chord', str(round(c, 3)), section)
-	createSimpleKVP('xOffset', str(round(x_sweep, 3)), section)
+	createSimpleKVP('xOffset', str(round(x_sweep, 3) + 0.0), section) #+ 0.0 avoids writing -0.0
 	createSimpleKVP('Dihedral', str(round(dihedral, 3)), section)
 	createSimpleKVP('Twist', str(round(twist, 3)), section)
 	createSimpleKVP('x_number_of_panels', str(x_panels), section)
@@ -34,15 +34,152 @@ def chordElliptical(y, root_chord, span):
 	return c
 
 def chordRect(y, chord):
-	return chord
+	return np.ones_like(y, dtype=float) * chord
 
 def chordTaper(y, root_chord, span, taper_ratio):
 	grad = 2* root_chord/span * (taper_ratio - 1)
-	if(y<0):
-		grad *= -1
-	c = y*grad + root_chord
+	c = np.abs(y)*grad + root_chord #symmetric about the root
 	return c
 
+planform_shapes = {} #shape name: shape definition, see registerShape
+
+def registerShape(name, chord, fore = None, aft = None, params = None, area = None, keys = (), n_points = 200):
+	"""
+	Register a planform shape so that it can be used as shape_args["shape"].
+	Every function takes y first, as either a float or a numpy array of spanwise positions.
+	Params:
+		<string> name - the name used in shape_args["shape"]
+		<function> chord(y, *params(wing)) - chord length at spanwise position y
+		<function> fore(y, wing) - x position of the LE, defaults to a straight LE along x = 0
+		<function> aft(y, wing) - x position of the TE (negative aft), defaults to fore - chord
+		<function> params(wing) - tuple of parameters for chord other than y, defaults to (wing,)
+		<function> area(wing) - analytic planform area, integrated numerically if None
+		<tuple> keys - the shape_args keys this shape needs, each is stored as an attribute of the wing
+		<int> n_points - number of spanwise points needed to draw the planform
+	"""
+	if(params is None):
+		params = lambda wing: (wing,)
+	if(fore is None):
+		fore = lambda y, wing: np.zeros_like(y, dtype=float)
+	if(aft is None):
+		aft = lambda y, wing: fore(y, wing) - wing.chord(y)
+	planform_shapes[name] = {
+		"chord": chord,
+		"fore": fore,
+		"aft": aft,
+		"params": params,
+		"area": area,
+		"keys": tuple(keys),
+		"n_points": n_points}
+
+def getPlanformShape(name):
+	if(name not in planform_shapes):
+		raise ValueError("Unknown planform shape \"" + str(name) + "\", registered shapes are: " + ", ".join(planform_shapes))
+	return planform_shapes[name]
+
+def countPanels(panels, sides = 2):
+	"""
+	Total panels on every side of a wing, see Wing.getSides.
+	The last section is the tip so its y panels are not used by XFLR.
+	"""
+	return sides * sum(x * y for x, x_dist, y, y_dist in panels[:-1])
+
+def allocateSectionPanels(chords, budget, sides = 2, x_panels = 6, y_panels = 9, min_x_panels = 2, min_y_panels = 1):
+	"""
+	Distribute a panel budget across the sections of a wing.
+	Chordwise panels scale with the local chord, spanwise panels with the chord gradient to the next section.
+	Params:
+		<array> chords (m) - the chord length at each section, root first
+		<int> budget - the maximum number of panels on the entire wing (every side)
+		<int> sides - how many times XFLR builds the sections, see Wing.getSides
+		<int> x_panels - chordwise panels at the largest chord before scaling to the budget
+		<int> y_panels - spanwise panels at an average chord gradient before scaling to the budget
+		<int> min_x_panels, min_y_panels - fewest panels any section may have
+	returns: list of (x_panels, x_distribution, y_panels, y_distribution) per section, total panels
+	A single section is only a tip and holds no panels, so it keeps the defaults and the budget is ignored.
+	"""
+	if(budget < 0):
+		raise ValueError("Panel budget must not be negative, got " + str(budget))
+	chords = np.asarray(chords, dtype=float)
+	if(len(chords) < 2):
+		panels = [(max(x_panels, min_x_panels), "COSINE", max(y_panels, min_y_panels), "INVERSE SINE")] * len(chords)
+		return panels, countPanels(panels, sides)
+	if(not chords.max() > 0):
+		raise ValueError("Sections need a positive chord to share panels by, got a largest chord of " + str(chords.max()))
+	min_total = sides * (len(chords) - 1) * min_x_panels * min_y_panels
+	if(budget < min_total):
+		raise ValueError("Panel budget of " + str(budget) + " is below the minimum of " + str(min_total)
+			+ " for " + str(len(chords)) + " sections, use fewer sections or a larger budget")
+	#weights for the n-1 panels between sections, the tip section copies its neighbour
+	grads = np.abs(np.diff(chords))
+	if(grads.mean() > 0):
+		y_weights = 1 + grads / grads.mean()
+	else:
+		y_weights = np.ones_like(grads)
+	y_weights = np.append(y_weights, y_weights[-1]) / y_weights.mean()
+	x_weights = chords / chords.max()
+	#uniform spacing where the chord gradient barely changes compared to the wing's typical gradient
+	changes = np.abs(np.diff(grads))
+	if(len(changes) > 0):
+		changes = np.maximum(np.append(changes, changes[-1]), np.insert(changes, 0, changes[0])) #vs both neighbours
+	else:
+		changes = np.zeros_like(grads)
+	steady = changes <= 0.1 * grads.mean() + 1e-9 * chords.max()
+	y_dists = np.where(np.append(steady, steady[-1]), "UNIFORM", "INVERSE SINE")
+
+	def counts(scale):
+		xs = np.maximum(np.rint(scale * x_panels * x_weights), min_x_panels).astype(int)
+		ys = np.maximum(np.rint(scale * y_panels * y_weights), min_y_panels).astype(int)
+		return xs, ys, sides * np.sum((xs * ys)[:-1])
+
+	#bisect for the largest scale that fits the budget
+	low = 0.0
+	high = 2 * (budget / (sides * np.sum((x_panels * x_weights * y_panels * y_weights)[:-1])))**0.5 + 1
+	while(counts(high)[2] <= budget):
+		high *= 2
+	for i in range(50):
+		mid = (low + high) / 2
+		if(counts(mid)[2] <= budget):
+			low = mid
+		else:
+			high = mid
+	xs, ys, total = counts(low)
+
+	#rounding leaves some budget over, top up whichever count is furthest below its target
+	x_targets = (high * x_panels * x_weights)[:-1]
+	y_targets = (high * y_panels * y_weights)[:-1]
+	n = len(chords) - 1
+	while True:
+		costs = sides * np.concatenate((ys[:-1], xs[:-1])) #adding an x panel costs y panels and vice versa
+		shortfalls = np.concatenate((xs[:-1] / x_targets, ys[:-1] / y_targets))
+		shortfalls = np.where(costs <= budget - total, shortfalls, np.inf)
+		k = np.argmin(shortfalls)
+		if(shortfalls[k] == np.inf):
+			break
+		if(k < n):
+			xs[k] += 1
+		else:
+			ys[k - n] += 1
+		total += costs[k]
+
+	panels = [(int(x), "COSINE", int(y), str(y_dist)) for x, y, y_dist in zip(xs, ys, y_dists)]
+	return panels, countPanels(panels, sides)
+
+def allocateAircraftPanels(wings, budget, resolution = 50):
+	"""
+	Share a panel budget between several wings by the planform area XFLR builds for each
+	and set each wing's panel budget.
+	returns: total panels across all of the wings
+	"""
+	built_areas = [wing.area / 2 * wing.getSides() for wing in wings]
+	total_area = sum(built_areas)
+	total = 0
+	for wing, built_area in zip(wings, built_areas):
+		wing.setPanelBudget(int(budget * built_area / total_area))
+		total += wing.allocatePanels(resolution)[1]
+	print("Allocated "+ str(total) +" of "+ str(budget) +" panels across "+ str(len(wings)) +" wings")
+	return total
+
 global_wing_id = -1
 def incrimentWingID():
 	global global_wing_id
@@ -75,6 +212,8 @@ class Wing:
 	area = 0.0 #m^2
 	aspect_ratio = 0.0
 
+	panel_budget = None #max panels on the entire wing, None for XFLR's default panels per section
+
 	def __init__(self, foil = "NACA 1212",
 		angle_of_attack = 0.0, span = 8.0,
 		root_chord = 1.0, mass = 50.0,
@@ -92,7 +231,7 @@ class Wing:
 			<float> root_chord (m) - the chord length at the root of the wing
 			<float> mass (kg) - the mass of this wing
 			<dictionary> shape_args {
-				<string> "shape" - the planform shape of the wing
+				<string> "shape" - the planform shape of the wing, any shape added with registerShape
 				<float> "fsmf" - only if "shape": "ellipse"
 				<float> "taper_ratio" - the chord length of the tip as a fraction of root_chord
 				<float> "taper_bias" - how much of the taper should be achieved by the leading edge or trailing edge
@@ -109,19 +248,7 @@ class Wing:
 		self.span = span
 		self.root_chord = root_chord
 		self.mass = mass
-		self.shape = shape_args["shape"]
-		if(self.shape == "ellipse"):
-			self.fsmf = shape_args["fsmf"]
-			self.chord_func = chordElliptical
-			self.chord_params = (self.root_chord, self.span)
-		elif(self.shape == "rectangle"):
-			self.chord_func = chordRect
-			self.chord_params = (self.root_chord,)
-		elif(self.shape == "taper"):
-			self.chord_func = chordTaper
-			self.taper_ratio = shape_args["taper_ratio"]
-			self.chord_params = (self.root_chord, self.span, self.taper_ratio)
-			self.taper_bias = shape_args["taper_bias"]
+		self.setShapeArgs(shape_args["shape"], shape_args)
 		self._type = _type
 		self.symmetric_fin = symmetric_fin
 		self.double_fin = double_fin
@@ -130,6 +257,19 @@ class Wing:
 		if(draw):
 			self.draw()
 
+	def setShapeArgs(self, shape, shape_args):
+		"""
+		Set the shape and store the keys it was registered with from shape_args.
+		A key missing from shape_args keeps the value previously set on this wing.
+		"""
+		for key in getPlanformShape(shape)["keys"]:
+			if(key not in shape_args and key not in vars(self)):
+				raise ValueError("Shape \"" + str(shape) + "\" needs shape_args key \"" + key + "\"")
+		for key in getPlanformShape(shape)["keys"]:
+			if(key in shape_args):
+				setattr(self, key, shape_args[key])
+		self.shape = shape
+
 	def chordForeElliptical(self, y):
 		K_fore = self.root_chord * self.fsmf
 		c_fore = K_fore*(1-(2/self.span * y)**2)**0.5
@@ -151,30 +291,14 @@ class Wing:
 		return ca
 
 	def draw(self):
-		ys = []
-		c_fores = []
-		c_afts = []
-		#in independent ifs because number of points needed differs per planform shape
+		#number of points needed differs per planform shape
 		#rect needs few, elliptical needs many
-		if(self.shape == "ellipse"):
-			ys = np.linspace(-self.span/2, self.span/2, 200, True)
-			if(self._type == "vertical stabiliser"):
-				ys = np.linspace(0, self.span/2, 100, True)
-			c_fores = self.chordForeElliptical(ys)
-			c_afts = self.chordAftElliptical(ys)
-		elif(self.shape == "rectangle"):
-			ys = np.array([-self.span/2, self.span/2])
-			if(self._type == "vertical stabiliser"):
-				ys = np.array([0, self.span/2])
-			c_fores = np.array([0,0])
-			c_afts = np.array([-self.root_chord, -self.root_chord])
-		elif(self.shape == "taper"):
-			ys = np.array([-self.span/2, 0, self.span/2])
-			if(self._type == "vertical stabiliser"):
-				ys = np.array([0, self.span/2]) #only plot half
-			for y in ys:
-				c_fores.append(self.chordForeTaper(y))
-				c_afts.append(self.chordAftTaper(y))
+		n = getPlanformShape(self.shape)["n_points"]
+		ys = np.linspace(-self.span/2, self.span/2, n, True)
+		if(self._type == "vertical stabiliser"):
+			ys = np.linspace(0, self.span/2, n//2 + 1, True) #only plot half
+		c_fores = self.chordFore(ys)
+		c_afts = self.chordAft(ys)
 			
 		plt.figure(figsize=(16, 9), dpi = 80)
 		plt.plot(ys, c_fores, label = 'LE')
@@ -191,14 +315,25 @@ class Wing:
 		plt.title(self._type + " " +str(self._id))
 		plt.legend()
 
+	def chordFore(self, y):
+		return getPlanformShape(self.shape)["fore"](y, self)
+
+	def chordAft(self, y):
+		return getPlanformShape(self.shape)["aft"](y, self)
+
+	def chord(self, y):
+		return self.chord_func(y, *self.chord_params)
+
 	def updateShape(self):
-		if(self.shape == "ellipse"):
-			self.chord_params = (self.root_chord, self.span)
-		elif(self.shape == "rectangle"):
-			self.chord_params = (self.root_chord,)
+		shape = getPlanformShape(self.shape)
+		self.chord_func = shape["chord"]
+		self.chord_params = shape["params"](self)
 
 	def updateArea(self):
-		if self.chord_params is not None:
+		area = getPlanformShape(self.shape)["area"]
+		if area is not None:
+			self.area = area(self)
+		elif self.chord_params is not None:
 			self.area = 2 * quad(self.chord_func, 0, self.span/2, self.chord_params)[0]
 		else:
 			self.area = 2 * quad(self.chord_func, 0, self.span/2)[0]
@@ -212,6 +347,24 @@ class Wing:
 		self.updateArea()
 		self.updateAspectRatio()
 
+	def sections(self, resolution=50):
+		dx = self.span/(2*resolution)
+		ys = np.arange(resolution) * dx
+		cs = self.chord(ys)
+		cs = np.where(cs <= 0.0, 0.001, cs) #zero chord sections break XFLR's Reynolds number calculations
+		x_offs = self.chordFore(ys)
+		return ys, cs, x_offs
+
+	def allocatePanels(self, resolution=50):
+		"""
+		returns: list of (x_panels, x_distribution, y_panels, y_distribution) per section, total panels
+		"""
+		cs = self.sections(resolution)[1]
+		if(self.panel_budget is None):
+			panels = [(6, "COSINE", 9, "INVERSE SINE")] * len(cs)
+			return panels, countPanels(panels, self.getSides())
+		return allocateSectionPanels(cs, self.panel_budget, self.getSides())
+
 	#To XML
 
 	def wingToXML(self, resolution=50):
@@ -281,24 +434,11 @@ class Wing:
 		
 		sections = el.SubElement(wing, 'Sections')
 		#createSection(sections, 0.000, self.root_chord, self.foil, -self.fsmf*self.root_chord) #root
-		dx = self.span/(2*resolution)
-		y = 0.0
-		while(y < self.span/2):
-			c = 1.0
-			x_off = 0.0
-			if(self.shape == "ellipse"):
-				c = chordElliptical(y, self.root_chord, self.span)
-				x_off = self.chordForeElliptical(y)
-				if(c == 0.00):
-					c = 0.001
-			elif(self.shape == "rectangle"):
-				c = self.root_chord
-				x_off = 0
-			elif(self.shape == "taper"):
-				c = chordTaper(y, self.root_chord, self.span, self.taper_ratio)
-				x_off = self.chordForeTaper(y)
-			createSection(sections, y, c, self.foil, -x_off)
-			y+=dx
+		ys, cs, x_offs = self.sections(resolution)
+		panels, total = self.allocatePanels(resolution)
+		for y, c, x_off, (x_panels, x_dist, y_panels, y_dist) in zip(ys, cs, x_offs, panels):
+			createSection(sections, y, c, self.foil, -x_off, x_panels = x_panels, x_distribution = x_dist,
+				y_panels = y_panels, y_distribution = y_dist)
 		#createSection(sections, self.span/2, 0.000, "NACA1212", 0.000, 0.000, 0.000, 13, "COSINE", 5,"UNIFORM") #tip
 		save_path = 'geometry'
 		if(not os_p.exists(save_path)):
@@ -308,7 +448,7 @@ class Wing:
 			file.write('<?xml version="1.0" encoding="UTF-8"?><!DOCTYPE explane>'.encode('utf-8'))
 			el.ElementTree(explane).write(file, encoding='utf-8')
 		
-		print("Successfully created file "+ selfname +".xml")
+		print("Successfully created file "+ selfname +".xml with "+ str(total) +" panels")
 
 	#Getters and Setters
 	def getID(self):
@@ -341,6 +481,20 @@ class Wing:
 	def getChordFunction(self):
 		return self.chord_func
 
+	def getSides(self):
+		#number of copies of the semi-wing that XFLR builds
+		if(self._type != "vertical stabiliser"):
+			return 2
+		sides = 1
+		if(self.symmetric_fin):
+			sides *= 2
+		if(self.double_fin):
+			sides *= 2
+		return sides
+
+	def getPanelBudget(self):
+		return self.panel_budget
+
 	def isSymmetricFin(self):
 		return self.symmetric_fin
 
@@ -364,10 +518,10 @@ class Wing:
 	def setMass(self, mass):
 		self.mass = mass
 
-	def setShape(self, shape, draw=False):
-		self.shape = shape
-		if(shape == "ellipse"):
-			self.chord_func = chordElliptical
+	def setShape(self, shape, draw=False, shape_args=None):
+		if(shape_args is None):
+			shape_args = {}
+		self.setShapeArgs(shape, shape_args)
 		self.updateAll()
 
 	def setFSMF(self, fsmf, draw=False):
@@ -375,6 +529,10 @@ class Wing:
 
 	def setTaperRatio(self, taper_ratio):
 		self.taper_ratio = taper_ratio
+		self.updateAll()
+
+	def setPanelBudget(self, panel_budget):
+		self.panel_budget = panel_budget
 
 	def setIsSymmetricFin(self, is_symmetric_fin):
 		self.symmetric_fin = is_symmetric_fin
@@ -382,6 +540,23 @@ class Wing:
 	def setIsDoubleFin(self, is_double_fin):
 		self.double_fin = is_double_fin
 
+registerShape("ellipse", chordElliptical,
+	lambda y, wing: wing.chordForeElliptical(y),
+	lambda y, wing: wing.chordAftElliptical(y),
+	lambda wing: (wing.root_chord, wing.span),
+	lambda wing: math.pi/4 * wing.root_chord * wing.span,
+	("fsmf",), 200)
+registerShape("rectangle", chordRect, None, None,
+	lambda wing: (wing.root_chord,),
+	lambda wing: wing.root_chord * wing.span,
+	(), 2)
+registerShape("taper", chordTaper,
+	lambda y, wing: wing.chordForeTaper(y),
+	lambda y, wing: wing.chordAftTaper(y),
+	lambda wing: (wing.root_chord, wing.span, wing.taper_ratio),
+	lambda wing: wing.root_chord * wing.span * (1 + wing.taper_ratio)/2,
+	("taper_ratio", "taper_bias"), 3)
+
 #LIBRARY CREDIT: Michel Robijns
 import naca.naca as naca
 